@@ -1,13 +1,15 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
+import threading
 import os
 import hashlib
+import hmac
 from datetime import datetime
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+from reportlab.platypus import SimpleDocTemplate, Paragraph, LongTable
 from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-import matplotlib.pyplot as plt
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+import plotly.graph_objects as go
 from io import BytesIO
 
 
@@ -20,54 +22,148 @@ st.set_page_config(
     page_icon="📊"
 )
 
-os.makedirs("reports", exist_ok=True)
-
 
 # =====================================================
-# DARK STYLE
+# CONSTANTS
 # =====================================================
-plt.style.use("dark_background")
-
 GREEN = "#2ecc71"
 RED = "#e74c3c"
 BLUE = "#3498db"
 
+# columns printed as rupee amounts in the PDF
+MONEY_COLUMNS = ("Amount", "GST", "Total")
+
+# upload columns (any case) that already carry the GST amount
+GST_COLUMNS = {"gst", "tax"}
+
 
 # =====================================================
 # DATABASE
 # =====================================================
-conn = sqlite3.connect("database.db", check_same_thread=False)
+SQL_INSERT_USER = "INSERT INTO users(username,password,salt) VALUES(?,?,?)"
+SQL_SELECT_USER = "SELECT password,salt FROM users WHERE username=?"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password=?, salt=? WHERE username=?"
+SQL_INSERT_REPORT = "INSERT INTO reports(username,date,total_amount,total_gst,grand_total) VALUES(?,?,?,?,?)"
+SQL_SELECT_HISTORY = "SELECT date,total_amount,total_gst,grand_total FROM reports WHERE username=? ORDER BY id DESC LIMIT ? OFFSET ?"
+SQL_COUNT_HISTORY = "SELECT COUNT(*) FROM reports WHERE username=?"
+SQL_SELECT_MONTHLY = """
+SELECT strftime('%Y-%m', date) AS date,
+       SUM(total_amount) AS total_amount,
+       SUM(total_gst) AS total_gst,
+       SUM(grand_total) AS grand_total
+FROM reports
+WHERE username=?
+GROUP BY 1
+ORDER BY 1
+"""
+SQL_DELETE_HISTORY = "DELETE FROM reports WHERE username=?"
+
+
+# one connection per server process, shared across reruns
+@st.cache_resource
+def get_conn():
+
+    conn = sqlite3.connect("database.db", check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    # USERS TABLE
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password BLOB,
+        salt BLOB
+    )
+    """)
+
+    # databases created before salted hashes have no salt column
+    user_cols = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if "salt" not in user_cols:
+        conn.execute("ALTER TABLE users ADD COLUMN salt BLOB")
+
+    # REPORTS TABLE (per user)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reports(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        date TEXT,
+        total_amount REAL,
+        total_gst REAL,
+        grand_total REAL
+    )
+    """)
+
+    # history is always read per user, newest first
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reports_user ON reports(username, id DESC)"
+    )
+
+    conn.commit()
+
+    return conn
+
+
+# the connection is shared by every session; all use of it goes through
+# this lock so one session's rollback can't undo another's open write
+@st.cache_resource
+def get_db_lock():
+    return threading.Lock()
+
+
+conn = get_conn()
+db_lock = get_db_lock()
 cursor = conn.cursor()
 
-# USERS TABLE
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE,
-    password TEXT
-)
-""")
-
-# REPORTS TABLE (per user)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS reports(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT,
-    date TEXT,
-    total_amount REAL,
-    total_gst REAL,
-    grand_total REAL
-)
-""")
+# history table rows per page, newest first; monthly totals cover all
+HISTORY_PAGE_SIZE = 200
+
+
+# history reads are cached per user; Save and Clear invalidate them
+@st.cache_data(ttl=60, show_spinner=False)
+def load_history(user, page):
+    offset = (page - 1) * HISTORY_PAGE_SIZE
+    with db_lock:
+        return pd.read_sql_query(
+            SQL_SELECT_HISTORY, conn, params=(user, HISTORY_PAGE_SIZE, offset)
+        )
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def count_history(user):
+    with db_lock:
+        return conn.execute(SQL_COUNT_HISTORY, (user,)).fetchone()[0]
 
-conn.commit()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_monthly(user):
+    with db_lock:
+        return pd.read_sql_query(SQL_SELECT_MONTHLY, conn, params=(user,))
+
+
+def clear_history_cache():
+    load_history.clear()
+    count_history.clear()
+    load_monthly.clear()
 
 
 # =====================================================
 # PASSWORD HASH
 # =====================================================
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password, salt):
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32
+    )
+
+
+def check_password(password, stored, salt):
+
+    # legacy rows hold an unsalted sha256 hex digest
+    if salt is None:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(stored, legacy)
+
+    return hmac.compare_digest(stored, hash_password(password, salt))
 
 
 # =====================================================
@@ -97,12 +193,15 @@ def register():
             st.warning("Fill all fields")
             return
 
+        salt = os.urandom(16)
+        digest = hash_password(pwd, salt)
+
         try:
-            cursor.execute(
-                "INSERT INTO users(username,password) VALUES(?,?)",
-                (user, hash_password(pwd))
-            )
-            conn.commit()
+            with db_lock, conn:
+                cursor.execute(
+                    SQL_INSERT_USER,
+                    (user, digest, salt)
+                )
             st.success("Account created! Now login.")
         except:
             st.error("Username already exists")
@@ -117,12 +216,22 @@ def login():
 
     if st.button("Login", key="login_btn"):
 
-        cursor.execute(
-            "SELECT * FROM users WHERE username=? AND password=?",
-            (user, hash_password(pwd))
-        )
+        with db_lock:
+            cursor.execute(SQL_SELECT_USER, (user,))
+            row = cursor.fetchone()
+
+        if row and check_password(pwd, *row):
+
+            # upgrade legacy hashes on first successful login
+            if row[1] is None:
+                salt = os.urandom(16)
+                digest = hash_password(pwd, salt)
+                with db_lock, conn:
+                    cursor.execute(
+                        SQL_UPDATE_PASSWORD,
+                        (digest, salt, user)
+                    )
 
-        if cursor.fetchone():
             st.session_state.logged_in = True
             st.session_state.user = user
             st.rerun()
@@ -163,57 +272,129 @@ with st.sidebar:
 # =====================================================
 # PDF GENERATOR
 # =====================================================
-def generate_pdf(df, ta, tg, gt, filename):
+# large frames are split into independent tables of this many rows
+PDF_CHUNK_ROWS = 2000
+
+TABLE_STYLE = [
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("PADDING", (0, 0), (-1, -1), 8),
+]
 
-    path = f"reports/{filename}"
+
+def generate_pdf(df, ta, tg, gt):
+
+    # built in memory; nothing is written to disk
+    buffer = BytesIO()
     doc = SimpleDocTemplate(
-        path,
+        buffer,
         rightMargin=40,
         leftMargin=40,
         topMargin=40,
         bottomMargin=40
     )
 
+    # vertical gaps live on the flowables, no standalone Spacers
     styles = getSampleStyleSheet()
-    elements = []
+    title_style = ParagraphStyle(
+        "ReportTitle", parent=styles["Heading1"], spaceAfter=30
+    )
+    totals_style = ParagraphStyle(
+        "ReportTotals", parent=styles["Heading3"], spaceBefore=40
+    )
 
     # ===== TITLE =====
-    title = Paragraph("GST Compliance Report", styles["Heading1"])
-    elements.append(title)
-    elements.append(Spacer(1, 30))
+    elements = [Paragraph("GST Compliance Report", title_style)]
 
 
     # ===== TABLE =====
-    table_data = [list(df.columns)] + df.values.tolist()
-
-    table = Table(table_data, hAlign="CENTER")   # ⭐ CENTERED
-
-    table.setStyle([
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("PADDING", (0, 0), (-1, -1), 8),
-    ])
+    # format money columns once per column, not per cell;
+    # missing cells print blank rather than nan / <NA>
+    cells = df.copy(deep=False)
+    for c in MONEY_COLUMNS:
+        if c in cells.columns:
+            cells[c] = cells[c].map("{:,.2f}".format, na_action="ignore")
+    cells = cells.astype(object).where(cells.notna(), "")
+
+    header = cells.columns.tolist()
+    rows = list(cells.itertuples(index=False, name=None))
+
+    # bounded chunks keep layout cost linear in the row count;
+    # an empty frame still gets its header-only table
+    for i in range(0, max(len(rows), 1), PDF_CHUNK_ROWS):
+
+        # header row repeats on every page
+        table = LongTable(
+            [header] + rows[i:i + PDF_CHUNK_ROWS],
+            hAlign="CENTER",   # ⭐ CENTERED
+            repeatRows=1,
+            spaceBefore=12 if i else 0
+        )
+        table.setStyle(TABLE_STYLE)
 
-    elements.append(table)
-    elements.append(Spacer(1, 40))
+        elements.append(table)
 
 
     # ===== TOTALS (NO ₹ SYMBOL) =====
-    totals = [
+    totals = "<br/>".join([
         f"Total Amount : Rs. {ta:,.2f}",
         f"Total GST    : Rs. {tg:,.2f}",
         f"Grand Total  : Rs. {gt:,.2f}",
-    ]
+    ])
 
-    for t in totals:
-        elements.append(Paragraph(t, styles["Heading3"]))
+    elements.append(Paragraph(totals, totals_style))
 
 
     doc.build(elements)
 
-    return path
+    return buffer.getvalue()
+
+
+# =====================================================
+# EXCEL EXPORT
+# =====================================================
+# Streamlit samples large frames when hashing them, which can miss an
+# edited cell; key the cache on every row, the headers and the dtypes
+def frame_digest(df):
+    return (
+        pd.util.hash_pandas_object(df).to_numpy().tobytes(),
+        tuple(map(str, df.columns)),
+        tuple(map(str, df.dtypes)),
+    )
+
+
+# only runs when the Excel button is clicked (deferred download data);
+# cached so repeat clicks on the same frame don't rebuild the workbook
+@st.cache_data(
+    max_entries=8,
+    show_spinner=False,
+    hash_funcs={pd.DataFrame: frame_digest}
+)
+def to_xlsx_bytes(df):
+
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine="xlsxwriter")
+
+    return buffer.getvalue()
+
+
+# =====================================================
+# FILE LOADER
+# =====================================================
+# parsed once per upload; reruns hit the cache, which keeps only the
+# most recent uploads so large frames don't pile up in server memory
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_frame(name, data):
+
+    bio = BytesIO(data)
+
+    if name.endswith((".csv", ".txt")):
+        return pd.read_csv(bio, engine="pyarrow", dtype_backend="pyarrow")
+
+    return pd.read_excel(bio, engine="calamine")
+
 
 # =====================================================
 # MAIN UI
@@ -228,26 +409,33 @@ uploaded = st.file_uploader("Upload Excel / CSV / TXT", type=["xlsx", "csv", "tx
 # =====================================================
 if uploaded:
 
-    if uploaded.name.endswith((".csv", ".txt")):
-        df = pd.read_csv(uploaded)
-    else:
-        df = pd.read_excel(uploaded)
+    df = load_frame(uploaded.name, uploaded.getvalue())
 
     if "Amount" not in df.columns:
         st.error("File must contain 'Amount' column")
         st.stop()
 
-    df["Amount"] = df["Amount"].astype(str).str.replace(",", "").astype(float)
+    # only text columns need the thousands separator stripped
+    amount = df["Amount"]
+    if not pd.api.types.is_numeric_dtype(amount):
+        amount = amount.astype(str).str.replace(",", "", regex=False)
+    # NumPy float64 whatever the reader produced: coercion on Arrow-backed
+    # CSV columns leaves NaN that isna()/fillna() would not see as missing
+    df["Amount"] = pd.to_numeric(amount, errors="coerce").astype("float64")
 
     st.subheader("📄 Data Preview")
     st.dataframe(df, use_container_width=True)
 
 
     # GST calculation
-    gst_cols = [c for c in df.columns if c.lower() in ["gst", "tax"]]
+    gst_mask = df.columns.astype(str).str.lower().isin(GST_COLUMNS)
 
-    if gst_cols:
-        df["GST"] = pd.to_numeric(df[gst_cols[0]], errors="coerce").fillna(0)
+    if gst_mask.any():
+        df["GST"] = (
+            pd.to_numeric(df.iloc[:, gst_mask.argmax()], errors="coerce")
+            .astype("float64")
+            .fillna(0)
+        )
     else:
         rate = st.selectbox("GST Rate (%)", [5, 12, 18, 28])
         df["GST"] = df["Amount"] * rate / 100
@@ -255,9 +443,12 @@ if uploaded:
     df["Total"] = df["Amount"] + df["GST"]
 
 
-    ta = df["Amount"].sum()
-    tg = df["GST"].sum()
-    gt = df["Total"].sum()
+    # one reduction over all three columns; nulls count as zero
+    ta, tg, gt = (
+        df[["Amount", "GST", "Total"]]
+        .to_numpy(dtype="float64", na_value=0.0)
+        .sum(axis=0)
+    )
 
 
     # =====================================================
@@ -278,32 +469,32 @@ if uploaded:
 
 
     # ---------- BAR ----------
+    # drawn client-side by Streamlit, no server-side rasterization
     with colA:
-        fig1, ax1 = plt.subplots(figsize=(3.8, 3.5))
-
-        ax1.bar(
-            ["Amount", "GST", "Total"],
-            [ta, tg, gt],
-            color=[GREEN, RED, BLUE]
+        st.caption("GST Breakdown")
+        # wide form: Streamlit pins the colour domain to the column
+        # order, so each bar keeps its colour
+        st.bar_chart(
+            pd.DataFrame(
+                {"Amount": [ta], "GST": [tg], "Total": [gt]},
+                index=["Totals"]
+            ),
+            color=[GREEN, RED, BLUE],
+            stack=False,
+            height=350
         )
 
-        ax1.set_title("GST Breakdown")
-        st.pyplot(fig1, width="content")
-
 
     # ---------- PIE ----------
     with colB:
-        fig2, ax2 = plt.subplots(figsize=(3.8, 3.5))
-
-        ax2.pie(
-            [ta, tg],
+        fig = go.Figure(go.Pie(
+            values=[ta, tg],
             labels=["Amount", "GST"],
-            colors=[GREEN, RED],
-            autopct="%1.1f%%"
-        )
-
-        ax2.set_title("Amount vs GST Share")
-        st.pyplot(fig2, width="content")
+            marker_colors=[GREEN, RED],
+            textinfo="percent"
+        ))
+        fig.update_layout(title="Amount vs GST Share", height=350)
+        st.plotly_chart(fig)
 
 
 
@@ -314,28 +505,30 @@ if uploaded:
 
     with col1:
         if st.button("💾 Save"):
-            cursor.execute(
-                "INSERT INTO reports(username,date,total_amount,total_gst,grand_total) VALUES(?,?,?,?,?)",
-                (
-                    st.session_state.user,
-                    datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    ta, tg, gt
+            with db_lock, conn:
+                cursor.execute(
+                    SQL_INSERT_REPORT,
+                    (
+                        st.session_state.user,
+                        datetime.now().strftime("%Y-%m-%d %H:%M"),
+                        ta, tg, gt
+                    )
                 )
-            )
-            conn.commit()
+            clear_history_cache()
             st.success("Saved!")
 
     with col2:
         if st.button("📥 PDF"):
             name = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            path = generate_pdf(df, ta, tg, gt, name)
-            with open(path, "rb") as f:
-                st.download_button("Download PDF", f, name)
+            pdf = generate_pdf(df, ta, tg, gt)
+            st.download_button("Download PDF", pdf, name)
 
     with col3:
-        buffer = BytesIO()
-        df.to_excel(buffer, index=False)
-        st.download_button("📥 Excel", buffer.getvalue(), "report.xlsx")
+        st.download_button(
+            "📥 Excel",
+            data=lambda: to_xlsx_bytes(df),
+            file_name="report.xlsx"
+        )
 
 
 # =====================================================
@@ -344,46 +537,49 @@ if uploaded:
 st.divider()
 st.subheader("📁 History")
 
-hist = pd.read_sql_query(
-    "SELECT date,total_amount,total_gst,grand_total FROM reports WHERE username=? ORDER BY id DESC",
-    conn,
-    params=(st.session_state.user,)
-)
+total_reports = count_history(st.session_state.user)
+
+if total_reports:
+
+    pages = -(-total_reports // HISTORY_PAGE_SIZE)
+    page = 1
+
+    if pages > 1:
+        page = st.number_input(
+            "Page", min_value=1, max_value=pages, value=1, step=1,
+            key="history_page"
+        )
 
-if not hist.empty:
+    hist = load_history(st.session_state.user, page)
 
-    hist.index = hist.index + 1
+    # Sr No keeps counting across pages
+    hist.index = hist.index + 1 + (page - 1) * HISTORY_PAGE_SIZE
     hist.index.name = "Sr No"
 
     st.dataframe(hist, use_container_width=True)
 
-    hist["date"] = pd.to_datetime(hist["date"])
+    if pages > 1:
+        st.caption(f"Page {page} of {pages} ({total_reports} reports)")
 
-    monthly = (
-        hist.groupby(hist["date"].dt.to_period("M"))
-        [["total_amount", "total_gst", "grand_total"]]
-        .sum()
-        .reset_index()
-    )
+    # aggregated in SQLite, no per-row date parsing in pandas
+    monthly = load_monthly(st.session_state.user)
 
-    monthly["date"] = monthly["date"].astype(str)
     monthly.index = monthly.index + 1
     monthly.index.name = "Sr No"
 
     st.subheader("📅 Monthly Summary")
     st.dataframe(monthly, use_container_width=True)
 
-    fig3, ax3 = plt.subplots(figsize=(5, 3))
-    ax3.bar(monthly["date"], monthly["grand_total"], color=BLUE)
-    ax3.set_title("Monthly Grand Total")
-    st.pyplot(fig3, width="content")
+    st.caption("Monthly Grand Total")
+    st.bar_chart(monthly, x="date", y="grand_total", color=BLUE, height=300)
 
     if st.button("🗑 Clear My History"):
-        cursor.execute(
-            "DELETE FROM reports WHERE username=?",
-            (st.session_state.user,)
-        )
-        conn.commit()
+        with db_lock, conn:
+            cursor.execute(
+                SQL_DELETE_HISTORY,
+                (st.session_state.user,)
+            )
+        clear_history_cache()
         st.rerun()
 
 else:
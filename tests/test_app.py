@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+
+    # database.db is created in the working directory
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["logged_in"] = True
+    at.session_state["user"] = "tester"
+    at.run()
+
+    return at
+
+
+def metrics(at):
+    return {m.label: m.value for m in at.metric}
+
+
+def test_non_numeric_gst_cell_counts_as_zero(app):
+
+    csv = b"Item,Amount,GST\na,100,18\nb,200,x\n"
+    app.file_uploader[0].set_value(("sales.csv", csv, "text/csv"))
+    app.run()
+
+    assert not app.exception
+    assert metrics(app) == {
+        "Amount": "₹300.00",
+        "GST": "₹18.00",
+        "Grand Total": "₹318.00",
+    }
+
+
+def test_breakdown_chart_keeps_bar_colours(app):
+
+    csv = b"Item,Amount\na,100\n"
+    app.file_uploader[0].set_value(("sales.csv", csv, "text/csv"))
+    app.run()
+
+    spec = json.loads(app.get("vega_lite_chart")[0].proto.spec)
+    scale = spec["encoding"]["color"]["scale"]
+
+    assert dict(zip(scale["domain"], scale["range"])) == {
+        "Amount": "#2ecc71",
+        "GST": "#e74c3c",
+        "Total": "#3498db",
+    }